@@ -1,11 +1,19 @@
 from rag_agent.app.prompt.prompter import Prompter
 from rag_agent.app.prompt.retriever import RAGRetriever
+from rag_agent.app.agent.session import SessionStore
 import time
 
 class RAGAgent:
-    def __init__(self):
+    def __init__(self, reuse_threshold=0.85, extend_threshold=0.6):
+        """
+        :param reuse_threshold: follow-up similarity at/above which the session's chunks are reused as-is
+        :param extend_threshold: similarity at/above which a small search extends the session's chunks
+        """
         self.retriever = RAGRetriever()
         self.prompter = Prompter()
+        self.sessions = SessionStore()
+        self.reuse_threshold = reuse_threshold
+        self.extend_threshold = extend_threshold
 
 
 
@@ -31,12 +39,12 @@ class RAGAgent:
         print(timings)
         return response
 
-    def generate_response_v2(self, query):
+    def generate_response_v2(self, query, adaptive=False):
         start_total = time.perf_counter()
 
         # --- Retrieval timing ---
         start_retrieval = time.perf_counter()
-        context = self.retriever.retrieve_v2(query, top_k=5)
+        context = self.retriever.retrieve_v2(query, top_k=5, adaptive=adaptive)
         end_retrieval = time.perf_counter()
 
         # --- LLM / Prompt timing ---
@@ -52,3 +60,68 @@ class RAGAgent:
         }
         print(timings)
         return response
+
+    def chat(self, session_id, query, top_k=5, extend_k=2):
+        """
+        Conversational variant of generate_response. A follow-up close to the
+        query that last ran a full search reuses that context (no Chroma query);
+        a moderately close one runs a small search and appends only new chunks;
+        anything else starts fresh. The prompt prefix is cached on the session.
+        """
+        start_total = time.perf_counter()
+        session = self.sessions.get(session_id)
+
+        # --- Embedding timing ---
+        start_embed = time.perf_counter()
+        query_emb = self.retriever.embed_query(query)
+        end_embed = time.perf_counter()
+        similarity = session.similarity(query_emb)
+
+        # --- Retrieval timing ---
+        start_retrieval = time.perf_counter()
+        chunks_added = 0
+        if session.chunks and similarity >= self.reuse_threshold:
+            mode = "reused"
+        elif session.chunks and similarity >= self.extend_threshold:
+            mode = "extended"
+            hits = self.retriever.search(query_emb, top_k=extend_k, exclude_ids=set(session.chunks))
+            chunks_added = session.extend_chunks(hits)
+        else:
+            mode = "full"
+            hits = self.retriever.search(query_emb, top_k=top_k)
+            session.replace_chunks(hits, query_emb)
+            chunks_added = len(session.chunks)
+        end_retrieval = time.perf_counter()
+
+        # --- Prompt prefix: rebuild only when the chunk set was replaced or trimmed ---
+        start_prefix = time.perf_counter()
+        prefix_rebuilt = session.prefix is None
+        if prefix_rebuilt:
+            session.prefix = self.prompter.build_prefix("\n".join(session.chunks.values()))
+        elif chunks_added:
+            new_docs = list(session.chunks.values())[-chunks_added:]
+            session.prefix += "\n" + "\n".join(new_docs)
+        end_prefix = time.perf_counter()
+
+        # --- LLM / Prompt timing ---
+        start_llm = time.perf_counter()
+        response = self.prompter.prompt_with_prefix(session.prefix, query, session.history())
+        end_llm = time.perf_counter()
+
+        end_total = time.perf_counter()
+        timings = {
+            "mode": mode,
+            "similarity": similarity,
+            "chunks_reused": len(session.chunks) - chunks_added,
+            "chunks_added": chunks_added,
+            "prefix_rebuilt": prefix_rebuilt,
+            "embed_time_ms": (end_embed - start_embed) * 1000,
+            "retrieval_time_ms": (end_retrieval - start_retrieval) * 1000,
+            "prefix_time_ms": (end_prefix - start_prefix) * 1000,
+            "llm_time_ms": (end_llm - start_llm) * 1000,
+            "total_time_ms": (end_total - start_total) * 1000
+        }
+        print(timings)
+
+        session.turns.append({"query": query, "response": response, "timings": timings})
+        return response
@@ -0,0 +1,91 @@
+import time
+from collections import OrderedDict, deque
+import numpy as np
+
+
+class ConversationSession:
+    """
+    State for one chat: recent turns, the embedding of the last retrieval query,
+    and the chunk set currently in context. The prompt prefix (instructions +
+    CONTEXT) is cached and only extended or rebuilt when the chunk set changes,
+    so follow-ups that reuse context send an identical prefix.
+    """
+
+    def __init__(self, max_turns: int = 6, max_chunks: int = 12):
+        self.turns = deque(maxlen=max_turns)
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()  # chunk id -> document, in prompt order
+        self.anchor_emb = None       # embedding of the query that last ran a full search
+        self.prefix = None
+        self.last_active = time.monotonic()
+
+    def similarity(self, query_emb) -> float:
+        """Cosine similarity between query_emb and the anchor query (0.0 if none)."""
+        if self.anchor_emb is None:
+            return 0.0
+        a = np.ravel(query_emb)
+        b = np.ravel(self.anchor_emb)
+        return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-12))
+
+    def replace_chunks(self, hits, query_emb):
+        self.chunks = OrderedDict((cid, doc) for cid, doc, _ in hits[:self.max_chunks])
+        self.anchor_emb = query_emb
+        self.prefix = None
+
+    def extend_chunks(self, hits) -> int:
+        """
+        Append new chunks after the existing ones (the cached prefix stays a
+        prefix). If that exceeds max_chunks the oldest chunks are dropped and the
+        prefix must be rebuilt. Returns the number of chunks added.
+        """
+        added = 0
+        for cid, doc, _ in hits:
+            if cid not in self.chunks:
+                self.chunks[cid] = doc
+                added += 1
+        if len(self.chunks) > self.max_chunks:
+            while len(self.chunks) > self.max_chunks:
+                self.chunks.popitem(last=False)
+            self.prefix = None
+        return added
+
+    def history(self):
+        return [(turn["query"], turn["response"]) for turn in self.turns]
+
+
+class SessionStore:
+    """
+    Bounded in-memory session store. Sessions idle longer than ttl_s are
+    dropped, and the least recently used session is evicted past max_sessions.
+    """
+
+    def __init__(self, max_sessions: int = 100, ttl_s: float = 1800.0, max_turns: int = 6, max_chunks: int = 12):
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self.max_turns = max_turns
+        self.max_chunks = max_chunks
+        self._sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [sid for sid, s in self._sessions.items() if now - s.last_active > self.ttl_s]
+        for sid in expired:
+            del self._sessions[sid]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def get(self, session_id: str) -> ConversationSession:
+        """Return the session for session_id, creating it if needed, and mark it recently used."""
+        session = self._sessions.pop(session_id, None)
+        if session is None or time.monotonic() - session.last_active > self.ttl_s:
+            session = ConversationSession(max_turns=self.max_turns, max_chunks=self.max_chunks)
+        session.last_active = time.monotonic()
+        self._sessions[session_id] = session
+        self._evict()
+        return session
+
+    def end(self, session_id: str):
+        self._sessions.pop(session_id, None)
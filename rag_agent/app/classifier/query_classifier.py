@@ -0,0 +1,55 @@
+from pathlib import Path
+import numpy as np
+
+FORMAT_VERSION = 1
+DEFAULT_WEIGHTS = Path(__file__).resolve().parents[2] / "classifier" / "query_classifier.npz"
+
+
+class QueryClassifier:
+    """
+    Lightweight runtime for the query classifier exported by classifier/classifer.py.
+    Holds the logistic regression as NumPy weight/bias arrays and scores
+    embeddings that were already computed (e.g. by RAGRetriever.embed_query),
+    so no sklearn import and no second embedding model are needed.
+    """
+
+    def __init__(self, weights_path: str = DEFAULT_WEIGHTS):
+        with np.load(weights_path, allow_pickle=False) as data:
+            version = int(data["format_version"])
+            if version != FORMAT_VERSION:
+                raise ValueError(
+                    f"Classifier weights at {weights_path} are format v{version}, "
+                    f"expected v{FORMAT_VERSION}. Re-run classifier/classifer.py."
+                )
+            self.weights = np.ascontiguousarray(data["weights"], dtype=np.float32)  # (n_classes, dim)
+            self.bias = data["bias"].astype(np.float32)                             # (n_classes,)
+            self.classes = data["classes"].tolist()
+            self.embedding_model = str(data["embedding_model"])
+            self.trained_at = str(data["trained_at"])
+
+    def predict_proba(self, embeddings) -> np.ndarray:
+        """
+        Class probabilities for a batch of embeddings, shape (n, n_classes).
+        A single embedding of shape (dim,) is treated as a batch of one.
+        """
+        x = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        logits = x @ self.weights.T + self.bias
+        logits -= logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        logits /= logits.sum(axis=1, keepdims=True)
+        return logits
+
+    def classify(self, embedding, threshold: float = 0.5):
+        """
+        Return (label, confidence) for one embedding. Falls back to "general"
+        when the top class is below threshold, same as the old joblib script.
+        """
+        probs = self.predict_proba(embedding)[0]
+        max_idx = int(probs.argmax())
+        label = self.classes[max_idx]
+        confidence = float(probs[max_idx])
+
+        if confidence < threshold:
+            label = "general"  # fallback if classifier isn't confident
+
+        return label, confidence
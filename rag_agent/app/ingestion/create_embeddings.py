@@ -1,6 +1,7 @@
 import os
 import json
 import glob
+import time
 import hashlib
 from tqdm import tqdm
 import torch
@@ -15,66 +16,101 @@ class ChunkVectorizer:
         output_dir=r"C:\Users\Michael\PycharmProjects\PersonalRAG\rag_agent\data\processed\embeddings",
         batch_size=64,
         device=None,
+        dedup_index=None,
     ):
+        """
+        :param dedup_index: optional NearDuplicateIndex; near-duplicate chunks are dropped before embedding
+        """
         self.chunk_dir = chunk_dir
         self.output_dir = output_dir
         self.batch_size = batch_size
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         self.model = SentenceTransformer(model_name, device=self.device)
+        self.dedup_index = dedup_index
+        self.orphaned_domains = set()  # domains holding chunks whose original went away
+
+        # Running totals used to estimate what near-dedup saved
+        self.embed_seconds = 0.0
+        self.embedded_chunks = 0
+        self.dedup_report = {"near_duplicates": 0, "embed_seconds_saved": 0.0, "index_bytes_saved": 0}
 
     # -------------------------------
-    # Process ONE domain file
+    # Chunk records (id, text, metadata)
     # -------------------------------
-    def process_file(self, chunk_path):
-        filename = os.path.basename(chunk_path)
-        domain_name = filename.replace("_chunks.json", "")
-        output_path = os.path.join(self.output_dir, f"{domain_name}_embeddings.json")
-
-        with open(chunk_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        chunks = []
-        metadata = []
-        ids = []
+    def build_records(self, data, domain_name):
+        """
+        Turn raw chunk dicts into parallel (ids, texts, metadata) lists,
+        skipping empty texts and de-duplicating by chunk id.
+
+        Missing ids are derived from (domain, source, text), so identical text in
+        two files gets two records and delete-by-source only touches its own
+        file. The bulk pipeline and the watcher must agree on this scheme.
+        """
+        unique = {}
+        loaded = 0
 
         for item in data:
             text = item.get("text", "").strip()
             if not text:
                 continue
 
+            source = item.get("source", "unknown")
             chunk_id = item.get(
-                "id", hashlib.md5(text.encode("utf-8")).hexdigest()
+                "id", hashlib.md5(f"{domain_name}/{source}\0{text}".encode("utf-8")).hexdigest()
             )
 
             meta = {
-                "source": item.get("source", "unknown"),
+                "source": source,
                 "chunk_index": item.get("chunk_index", -1),
                 "domain": domain_name,  # 🔥 domain tag for filtering later
             }
 
-            chunks.append(text)
-            metadata.append(meta)
-            ids.append(chunk_id)
-
-        print(f"[{domain_name}] Loaded {len(chunks)} chunks")
+            loaded += 1
+            if chunk_id not in unique:
+                unique[chunk_id] = (text, meta)
 
-        # Deduplicate
-        unique = {}
-        for text, meta, cid in zip(chunks, metadata, ids):
-            if cid not in unique:
-                unique[cid] = (text, meta)
+        print(f"[{domain_name}] Loaded {loaded} chunks")
 
         ids = list(unique.keys())
         chunks = [unique[cid][0] for cid in ids]
         metadata = [unique[cid][1] for cid in ids]
-
-        print(f"[{domain_name}] After dedup: {len(chunks)} chunks")
-
-        # Embed
+        return ids, chunks, metadata
+
+    def filter_near_duplicates(self, ids, chunks, metadata):
+        """
+        Drop chunks that nearly duplicate one already in dedup_index (other
+        chunks get indexed as they pass). Returns the kept lists plus the
+        dropped texts, for the savings report.
+        """
+        kept_ids, kept_chunks, kept_meta, dropped = [], [], [], []
+        for cid, text, meta in zip(ids, chunks, metadata):
+            match = self.dedup_index.check_and_add(cid, text, domain=meta["domain"], source=meta["source"])
+            if match is not None:
+                dropped.append(text)
+                continue
+            kept_ids.append(cid)
+            kept_chunks.append(text)
+            kept_meta.append(meta)
+        return kept_ids, kept_chunks, kept_meta, dropped
+
+    def record_savings(self, dropped_texts):
+        """Estimate embedding time and index space avoided by skipping dropped_texts."""
+        if not dropped_texts:
+            return
+        per_chunk = self.embed_seconds / self.embedded_chunks if self.embedded_chunks else 0.0
+        vector_bytes = self.model.get_sentence_embedding_dimension() * 4  # float32
+        self.dedup_report["near_duplicates"] += len(dropped_texts)
+        self.dedup_report["embed_seconds_saved"] += per_chunk * len(dropped_texts)
+        self.dedup_report["index_bytes_saved"] += sum(
+            vector_bytes + len(text.encode("utf-8")) for text in dropped_texts
+        )
+
+    def embed(self, texts, desc="Embedding"):
         embeddings = []
+        start = time.perf_counter()
 
-        for i in tqdm(range(0, len(chunks), self.batch_size), desc=f"Embedding {domain_name}"):
-            batch_texts = chunks[i:i + self.batch_size]
+        for i in tqdm(range(0, len(texts), self.batch_size), desc=desc):
+            batch_texts = texts[i:i + self.batch_size]
             batch_embeddings = self.model.encode(
                 batch_texts,
                 batch_size=self.batch_size,
@@ -83,6 +119,64 @@ class ChunkVectorizer:
             )
             embeddings.extend(batch_embeddings)
 
+        self.embed_seconds += time.perf_counter() - start
+        self.embedded_chunks += len(texts)
+        return embeddings
+
+    def update_embeddings_file(self, domain_name, source, ids, chunks, metadata, embeddings):
+        """
+        Replace one source file's entries in <domain>_embeddings.json (used by
+        the ingestion watcher), so the file stays a complete copy of the domain
+        for persist.py and tune_index.py, which rebuild Chroma from it.
+        """
+        output_path = os.path.join(self.output_dir, f"{domain_name}_embeddings.json")
+
+        output_data = []
+        if os.path.exists(output_path):
+            with open(output_path, "r", encoding="utf-8") as f:
+                output_data = json.load(f)
+        output_data = [item for item in output_data if item.get("metadata", {}).get("source") != source]
+
+        for cid, text, meta, emb in zip(ids, chunks, metadata, embeddings):
+            output_data.append({
+                "id": cid,
+                "text": text,
+                "metadata": meta,
+                "embedding": list(emb),
+            })
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(output_data, f)
+
+    # -------------------------------
+    # Process ONE domain file
+    # -------------------------------
+    def process_file(self, chunk_path):
+        filename = os.path.basename(chunk_path)
+        domain_name = filename.replace("_chunks.json", "")
+        output_path = os.path.join(self.output_dir, f"{domain_name}_embeddings.json")
+
+        with open(chunk_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        ids, chunks, metadata = self.build_records(data, domain_name)
+        print(f"[{domain_name}] After dedup: {len(chunks)} chunks")
+
+        # Near-duplicate filter: this file is rebuilt in full, so re-check its domain from scratch
+        dropped = []
+        if self.dedup_index is not None:
+            self.orphaned_domains.discard(domain_name)  # being re-checked right now
+            pairs = self.dedup_index.remove(domain=domain_name)
+            ids, chunks, metadata, dropped = self.filter_near_duplicates(ids, chunks, metadata)
+            # chunks elsewhere that duplicated one of ours which is gone now must be re-embedded
+            self.orphaned_domains.update(dep["domain"] for dep in self.dedup_index.restore(pairs))
+            print(f"[{domain_name}] After near-dedup: {len(chunks)} chunks ({len(dropped)} near-duplicates)")
+
+        # Embed
+        embeddings = self.embed(chunks, desc=f"Embedding {domain_name}")
+        self.record_savings(dropped)
+
         # Save
         os.makedirs(self.output_dir, exist_ok=True)
 
@@ -112,4 +206,16 @@ class ChunkVectorizer:
         print(f"Found {len(chunk_files)} domain files")
 
         for chunk_path in chunk_files:
-            self.process_file(chunk_path)
\ No newline at end of file
+            self.process_file(chunk_path)
+
+        if self.dedup_index is not None:
+            # one more pass for domains whose skipped chunks lost their original
+            rerun, self.orphaned_domains = self.orphaned_domains, set()
+            for domain_name in sorted(rerun):
+                chunk_path = os.path.join(self.chunk_dir, f"{domain_name}_chunks.json")
+                if os.path.exists(chunk_path):
+                    print(f"[{domain_name}] Re-processing: originals of some skipped chunks are gone")
+                    self.process_file(chunk_path)
+
+            self.dedup_index.save()
+            print("Near-dedup report:", self.dedup_report)
\ No newline at end of file
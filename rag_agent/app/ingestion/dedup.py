@@ -0,0 +1,223 @@
+import os
+import json
+import zlib
+import hashlib
+import numpy as np
+
+_PRIME = (1 << 31) - 1  # a, b < 2^31 and 32-bit shingle hashes keep a*x + b inside uint64
+
+
+class NearDuplicateIndex:
+    """
+    Persistent MinHash + LSH index for near-duplicate text detection.
+
+    Each text is reduced to a MinHash signature over word shingles. Signatures
+    are split into bands; texts sharing any band bucket become candidates and
+    are compared by estimated Jaccard similarity. Lookups only touch the
+    matching buckets, not the whole index.
+    """
+
+    def __init__(self, path: str, num_perm: int = 128, bands: int = 32,
+                 threshold: float = 0.8, shingle_size: int = 5, seed: int = 1,
+                 same_domain_only: bool = True):
+        """
+        :param path: JSON file the signatures are stored in
+        :param num_perm: MinHash signature length
+        :param bands: LSH bands (num_perm must divide evenly); more bands = more candidates
+        :param threshold: estimated Jaccard similarity at which a text counts as a duplicate
+        :param shingle_size: words per shingle
+        :param same_domain_only: only count matches within the same domain, since retrieval
+                                 filters by domain and a copy in another domain must stay findable there
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.same_domain_only = same_domain_only
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+        self.entries = {}  # id -> {"signature", "domain", "source", "duplicates": [{"id", "domain", "source", "signature"}]}
+        self.buckets = {}  # band key -> set of ids
+        self.stats = {"checked": 0, "duplicates": 0, "duplicate_chars": 0}
+
+        self.load()
+
+    # ---------- Signatures ---------- #
+    def shingles(self, text: str):
+        words = text.lower().split()
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in self.shingles(text)), dtype=np.uint64
+        )
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            yield f"{band}:{hashlib.md5(chunk.tobytes()).hexdigest()[:16]}"
+
+    # ---------- Index operations ---------- #
+    def add(self, item_id: str, signature: np.ndarray, domain: str = None, source: str = None):
+        if item_id in self.entries:
+            self.remove_ids([item_id])
+        self.entries[item_id] = {"signature": signature, "domain": domain, "source": source, "duplicates": []}
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, set()).add(item_id)
+
+    def remove_ids(self, ids):
+        """
+        Drop entries. Returns (removed_id, dependent) pairs for every item that
+        was skipped as a duplicate of a removed entry, so the caller can
+        restore() them once it knows whether the original still exists.
+        """
+        pairs = []
+        for item_id in ids:
+            entry = self.entries.pop(item_id, None)
+            if entry is None:
+                continue
+            pairs.extend((item_id, dep) for dep in entry["duplicates"])
+            for key in self._band_keys(entry["signature"]):
+                bucket = self.buckets.get(key)
+                if bucket:
+                    bucket.discard(item_id)
+                    if not bucket:
+                        del self.buckets[key]
+        return pairs
+
+    def remove(self, domain: str = None, source: str = None):
+        """
+        Forget every entry from a domain and/or source file (e.g. before
+        re-processing it), along with that file's own duplicate records, which
+        re-register if still duplicates. Returns dependents of the removed
+        entries as (removed_id, dependent) pairs; see restore().
+        """
+        def matches(item):
+            return (domain is None or item["domain"] == domain) and (source is None or item["source"] == source)
+
+        ids = [item_id for item_id, entry in self.entries.items() if matches(entry)]
+        pairs = [(item_id, dep) for item_id, dep in self.remove_ids(ids) if not matches(dep)]
+        for entry in self.entries.values():
+            entry["duplicates"] = [dep for dep in entry["duplicates"] if not matches(dep)]
+        return pairs
+
+    def restore(self, pairs):
+        """
+        Re-attach dependents whose original was indexed again (same id) and is
+        still a near-duplicate of them, and return the rest: items whose
+        original is gone or changed, which must be re-checked (and indexed) now
+        or their content is lost.
+        """
+        orphans = []
+        for item_id, dep in pairs:
+            entry = self.entries.get(item_id)
+            if entry is not None and np.mean(entry["signature"] == np.asarray(dep["signature"], dtype=np.uint64)) >= self.threshold:
+                self._link(entry, dep)
+            else:
+                orphans.append(dep)
+        return orphans
+
+    def _link(self, entry, dep):
+        entry["duplicates"] = [d for d in entry["duplicates"] if d["id"] != dep["id"]]
+        entry["duplicates"].append(dep)
+
+    def __contains__(self, item_id):
+        """True if item_id is indexed, or recorded as a duplicate of an indexed entry."""
+        if item_id in self.entries:
+            return True
+        return any(dep["id"] == item_id for entry in self.entries.values() for dep in entry["duplicates"])
+
+    def query(self, signature: np.ndarray, exclude_id: str = None, domain: str = None):
+        """
+        Most similar indexed id at or above threshold, as (id, similarity), else None.
+        If domain is given, only entries from that domain are considered.
+        """
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        candidates.discard(exclude_id)
+
+        best = None
+        for cand in candidates:
+            if domain is not None and self.entries[cand]["domain"] != domain:
+                continue
+            similarity = float(np.mean(self.entries[cand]["signature"] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (cand, similarity)
+        return best
+
+    def check_and_add(self, item_id: str, text: str, domain: str = None, source: str = None):
+        """
+        Return (duplicate_of_id, similarity) if text nearly duplicates an indexed
+        entry other than item_id itself, recording item_id as depending on it;
+        otherwise index it and return None.
+        """
+        signature = self.signature(text)
+        self.stats["checked"] += 1
+
+        # content-hash ids repeat across files: only the same file's entry is "itself"
+        own = self.entries.get(item_id)
+        same_file = own is not None and (own["domain"], own["source"]) == (domain, source)
+        match = self.query(signature, exclude_id=item_id if same_file else None,
+                           domain=domain if self.same_domain_only else None)
+        if match is not None:
+            self.stats["duplicates"] += 1
+            self.stats["duplicate_chars"] += len(text)
+            self._link(self.entries[match[0]], {
+                "id": item_id, "domain": domain, "source": source, "signature": signature.tolist(),
+            })
+            return match
+
+        self.add(item_id, signature, domain=domain, source=source)
+        return None
+
+    # ---------- Persistence ---------- #
+    def _params(self):
+        return {
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "shingle_size": self.shingle_size,
+            "same_domain_only": self.same_domain_only,  # links across domains are invalid otherwise
+            "seed_a0": int(self._a[0]),  # detects a changed seed
+        }
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("params") != self._params():
+            print(f"Warning: {self.path} was built with different MinHash settings; starting empty.")
+            return
+        for item_id, entry in data["entries"].items():
+            self.add(item_id, np.asarray(entry["signature"], dtype=np.uint64),
+                     domain=entry.get("domain"), source=entry.get("source"))
+            self.entries[item_id]["duplicates"] = entry.get("duplicates", [])
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        data = {
+            "params": self._params(),
+            "entries": {
+                item_id: {
+                    "signature": entry["signature"].tolist(),
+                    "domain": entry["domain"],
+                    "source": entry["source"],
+                    "duplicates": entry["duplicates"],
+                }
+                for item_id, entry in self.entries.items()
+            },
+        }
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
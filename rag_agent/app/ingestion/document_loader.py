@@ -2,7 +2,7 @@ import os
 import json
 import hashlib
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 from tqdm import tqdm
 import pdfplumber
 from pdf2image import convert_from_path
@@ -25,6 +25,8 @@ def safe_sent_tokenize(text: str) -> List[str]:
         # fallback if punkt fails
         return [s.strip() for s in text.split(".") if s.strip()]
 
+SUPPORTED_EXTENSIONS = {".pdf", ".md", ".txt"}
+
 # ---------- File hash function ---------- #
 def compute_file_hash(file_path: Path) -> str:
     """Compute SHA256 hash of a file for change detection"""
@@ -42,7 +44,8 @@ class DocumentLoader:
         processed_dir: str,
         chunk_size: int = 5,
         log_file: str = None,
-        use_hashing: bool = True  # FEATURE FLAG: enable/disable skipping processed files
+        use_hashing: bool = True,  # FEATURE FLAG: enable/disable skipping processed files
+        doc_dedup=None
     ):
         """
         :param raw_dir: path to raw documents
@@ -50,11 +53,15 @@ class DocumentLoader:
         :param chunk_size: sentences per chunk
         :param log_file: path to JSON file tracking processed files and hashes
         :param use_hashing: if False, all files are reprocessed regardless of log
+        :param doc_dedup: optional NearDuplicateIndex; files whose text nearly matches another file are skipped
         """
         self.raw_dir = Path(raw_dir)
         self.processed_dir = Path(processed_dir)
         self.chunk_size = chunk_size
         self.use_hashing = use_hashing
+        self.doc_dedup = doc_dedup
+        self.orphaned_files = {}  # path -> domain: duplicates whose original went away
+        self.chunks_skipped = 0  # chunks near-duplicate files would have produced
 
         # Ensure directories exist
         self.raw_dir.mkdir(parents=True, exist_ok=True)
@@ -156,15 +163,29 @@ class DocumentLoader:
         return f"{domain}_{text_hash}_chunk{chunk_idx}"
 
     # ---------- File Processing ---------- #
-    def process_document(self, file_path: Path, domain: str) -> List[Dict]:
+    def is_unchanged(self, file_path: Path, file_hash: str) -> bool:
+        """
+        True if hashing is enabled and file_path was already processed with this hash.
+        With doc_dedup, files the index has never seen (e.g. dedup was just
+        enabled on an existing corpus) count as changed so they get checked.
+        """
+        if not self.use_hashing or self.process_log.get(str(file_path)) != file_hash:
+            return False
+        return self.doc_dedup is None or str(file_path) in self.doc_dedup
+
+    def process_document(self, file_path: Path, domain: str) -> Optional[List[Dict]]:
+        """
+        Extract and chunk one file. Returns None if it was skipped (unchanged or
+        unsupported), otherwise its chunks; [] means the file changed but has
+        nothing to index (empty, failed extraction, near-duplicate).
+        """
         file_hash = compute_file_hash(file_path)
         file_key = str(file_path)
 
         # SKIP if hashing is enabled and file already processed
-        if self.use_hashing:
-            if file_key in self.process_log and self.process_log[file_key] == file_hash:
-                print(f"Skipping already processed file: {file_path.name}")
-                return []
+        if self.is_unchanged(file_path, file_hash):
+            print(f"Skipping already processed file: {file_path.name}")
+            return None
 
         # Extract text
         ext = file_path.suffix.lower()
@@ -172,13 +193,28 @@ class DocumentLoader:
             text = self.pdf_to_text(file_path)
             if not text.strip():
                 text = self.pdf_to_text_ocr(file_path)
-        elif ext in [".md", ".txt"]:
+        elif ext in SUPPORTED_EXTENSIONS:
             text = self.load_text_file(file_path)
         else:
             print(f"Unsupported file type: {file_path}")
-            return []
+            return None
 
         text = self.normalize_text(text)
+
+        # SKIP re-exports / copies of a document we already have
+        if self.doc_dedup is not None:
+            # re-check from scratch; files that duplicated the old version are re-attached or orphaned
+            pairs = self.doc_dedup.remove(domain=domain, source=file_path.name)
+            match = self.doc_dedup.check_and_add(file_key, text, domain=domain, source=file_path.name)
+            self.requeue(self.doc_dedup.restore(pairs))
+            if match is not None:
+                print(f"Skipping near-duplicate of {match[0]} ({match[1]:.0%} similar): {file_path.name}")
+                self.chunks_skipped += len(self.chunk_text(text))
+                # log the hash so an unchanged duplicate is not re-extracted (and OCR'd) every run
+                if self.use_hashing:
+                    self.process_log[file_key] = file_hash
+                return []
+
         chunks = self.chunk_text(text)
 
         # Create processed chunks with metadata
@@ -200,6 +236,97 @@ class DocumentLoader:
 
         return processed_chunks
 
+    # ---------- Domain chunk files ---------- #
+    def load_domain_chunks(self, domain: str) -> List[Dict]:
+        """Load a domain's chunk JSON as a list; if missing or invalid, start with an empty list."""
+        output_file = self.processed_dir / f"{domain}_chunks.json"
+        all_chunks = []
+        if output_file.exists():
+            try:
+                all_chunks = json.load(open(output_file, "r", encoding="utf-8"))
+                if not isinstance(all_chunks, list):
+                    print(f"Warning: {output_file} not a list; resetting to empty list.")
+                    all_chunks = []
+            except json.JSONDecodeError:
+                print(f"Warning: {output_file} is invalid JSON; resetting to empty list.")
+                all_chunks = []
+        return all_chunks
+
+    def save_domain_chunks(self, domain: str, all_chunks: List[Dict]):
+        """Save a domain's chunks as a valid JSON array."""
+        output_file = self.processed_dir / f"{domain}_chunks.json"
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(all_chunks, f, ensure_ascii=False, indent=2)
+        print(f"Saved {len(all_chunks)} chunks to {output_file}")
+
+    def save_log(self):
+        if self.doc_dedup is not None:
+            self.doc_dedup.save()
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.log_file, "w", encoding="utf-8") as f:
+            json.dump(self.process_log, f, ensure_ascii=False, indent=2)
+        print(f"Updated processing log: {self.log_file}")
+
+    # ---------- Single-file updates ---------- #
+    def update_source(self, file_path: Path, domain: str, force: bool = False):
+        """
+        Re-process one added/changed file and replace its chunks in the domain JSON.
+        Returns None if there is nothing to do (unsupported type, or hash unchanged),
+        otherwise the new chunks. [] means the content changed but produced no
+        chunks (emptied file, failed extraction, near-duplicate), so the file's
+        old chunks have been dropped and the caller must drop them from Chroma too.
+
+        :param force: re-process even if the hash is unchanged (e.g. its original went away)
+        """
+        if file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+            return None
+        if force:
+            self.process_log.pop(str(file_path), None)
+
+        new_chunks = self.process_document(file_path, domain)
+        if new_chunks is None:
+            return None
+
+        all_chunks = [c for c in self.load_domain_chunks(domain) if c.get("source") != file_path.name]
+        all_chunks.extend(new_chunks)
+        self.save_domain_chunks(domain, all_chunks)
+        self.save_log()
+        return new_chunks
+
+    def remove_source(self, file_path: Path, domain: str):
+        """Drop a deleted file's chunks from the domain JSON and forget its hash."""
+        all_chunks = self.load_domain_chunks(domain)
+        kept = [c for c in all_chunks if c.get("source") != file_path.name]
+        if len(kept) != len(all_chunks):
+            self.save_domain_chunks(domain, kept)
+        if self.doc_dedup is not None:
+            self.requeue(self.doc_dedup.restore(self.doc_dedup.remove(domain=domain, source=file_path.name)))
+        if self.process_log.pop(str(file_path), None) is not None or self.doc_dedup is not None:
+            self.save_log()
+
+    def dedup_report(self):
+        """Doc-level near-dedup counters plus the chunks skipped files would have produced."""
+        if self.doc_dedup is None:
+            return None
+        return {**self.doc_dedup.stats, "chunks_skipped": self.chunks_skipped}
+
+    # ---------- Orphaned duplicates ---------- #
+    def requeue(self, dependents):
+        """
+        Mark files that were skipped as duplicates of a now-removed original for
+        re-processing, and forget their hashes so they are not skipped as unchanged.
+        """
+        for dep in dependents:
+            self.process_log.pop(dep["id"], None)
+            self.orphaned_files[Path(dep["id"])] = dep["domain"]
+            print(f"Original of {dep['source']} is gone; re-queued it")
+
+    def pop_orphans(self):
+        orphans = list(self.orphaned_files.items())
+        self.orphaned_files = {}
+        return orphans
+
     # ---------- Batch Processing ---------- #
     def process_all(self):
         """
@@ -207,7 +334,8 @@ class DocumentLoader:
         Ensures each domain JSON is a valid array [].
         Updates chunks incrementally:
           - skips unchanged files if use_hashing=True
-          - removes old chunks for updated files
+          - removes old chunks for updated files, including ones that now
+            produce no chunks (emptied, or a near-duplicate of another file)
           - appends new chunks
         """
         if not self.raw_dir.exists():
@@ -218,49 +346,25 @@ class DocumentLoader:
             if not domain_dir.is_dir():
                 continue
             domain = domain_dir.name
-            output_file = self.processed_dir / f"{domain}_chunks.json"
-
-            # Load existing chunks as a list; if file missing or invalid, start with empty list
-            all_chunks = []
-            if output_file.exists():
-                try:
-                    all_chunks = json.load(open(output_file, "r", encoding="utf-8"))
-                    if not isinstance(all_chunks, list):
-                        print(f"Warning: {output_file} not a list; resetting to empty list.")
-                        all_chunks = []
-                except json.JSONDecodeError:
-                    print(f"Warning: {output_file} is invalid JSON; resetting to empty list.")
-                    all_chunks = []
-
-            # Build a map: source file -> list of chunk indices in all_chunks
-            source_index_map = {}
-            for idx, chunk in enumerate(all_chunks):
-                source_file = chunk.get("source")
-                if source_file not in source_index_map:
-                    source_index_map[source_file] = []
-                source_index_map[source_file].append(idx)
+            all_chunks = self.load_domain_chunks(domain)
 
             # Process each file in the domain
             for file_path in tqdm(list(domain_dir.iterdir()), desc=f"Processing {domain}"):
                 new_chunks = self.process_document(file_path, domain)
-                if not new_chunks:
-                    continue  # skipped or unsupported file
+                if new_chunks is None:
+                    continue  # unchanged or unsupported file
 
-                # Remove old chunks from this file if they exist
-                old_indices = source_index_map.get(file_path.name, [])
-                for i in sorted(old_indices, reverse=True):
-                    del all_chunks[i]
-
-                # Append new chunks
+                # Replace this file's old chunks (possibly with none)
+                all_chunks = [c for c in all_chunks if c.get("source") != file_path.name]
                 all_chunks.extend(new_chunks)
 
-            # Save updated chunks list as valid JSON array
-            output_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(all_chunks, f, ensure_ascii=False, indent=2)
-            print(f"Saved {len(all_chunks)} chunks to {output_file}")
+            self.save_domain_chunks(domain, all_chunks)
 
-        # Save updated processing log
-        with open(self.log_file, "w", encoding="utf-8") as f:
-            json.dump(self.process_log, f, ensure_ascii=False, indent=2)
-        print(f"Updated processing log: {self.log_file}")
+        # Index duplicates whose original was deleted or changed during this run
+        for file_path, domain in self.pop_orphans():
+            if file_path.exists():
+                self.update_source(file_path, domain)
+
+        self.save_log()
+        if self.doc_dedup is not None:
+            print("Doc-dedup report:", self.dedup_report())
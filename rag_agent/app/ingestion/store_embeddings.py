@@ -1,11 +1,62 @@
 import json
 import os
 import glob
+import numpy as np
 import chromadb
 from chromadb.config import Settings
 
+
+def stats_path(chroma_dir, collection_name):
+    """Location of the per-domain distance statistics written at ingestion time."""
+    return os.path.join(os.path.abspath(chroma_dir), f"{collection_name}_stats.json")
+
+
+def index_config_path(chroma_dir, collection_name):
+    """Location of the HNSW configuration chosen by IndexTuner."""
+    return os.path.join(os.path.abspath(chroma_dir), f"{collection_name}_index_config.json")
+
+
+def load_index_config(chroma_dir, collection_name):
+    path = index_config_path(chroma_dir, collection_name)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def hnsw_metadata(index_config):
+    """
+    Translate an index config ({"space", "M", "construction_ef", "search_ef"})
+    into Chroma collection metadata. Missing keys keep Chroma's defaults.
+    """
+    keys = {
+        "space": "hnsw:space",
+        "M": "hnsw:M",
+        "construction_ef": "hnsw:construction_ef",
+        "search_ef": "hnsw:search_ef",
+    }
+    return {chroma_key: index_config[key] for key, chroma_key in keys.items() if key in index_config}
+
+
+def to_l2_distance(distance, space):
+    """
+    Express a Chroma distance on the squared-L2 scale used by the retrieval
+    thresholds. For the normalized vectors ChunkVectorizer emits,
+    ||a - b||^2 = 2 * (1 - a.b), and both "cosine" and "ip" return 1 - a.b.
+    """
+    if space in ("cosine", "ip"):
+        return 2.0 * distance
+    return distance
+
+
 class ChromaIngestor:
-    def __init__(self, chroma_dir, collection_name, embeddings_dir):
+    def __init__(self, chroma_dir, collection_name, embeddings_dir, index_config=None, reset=False):
+        """
+        :param index_config: HNSW settings for a newly created collection; defaults to the
+                             saved IndexTuner config if present, else Chroma's defaults
+        :param reset: drop and recreate the collection (needed to apply a new index_config,
+                      since Chroma fixes HNSW settings at creation time)
+        """
         self.chroma_dir = os.path.abspath(chroma_dir)
         self.collection_name = collection_name
         self.embeddings_dir = os.path.abspath(embeddings_dir)
@@ -13,14 +64,39 @@ class ChromaIngestor:
         # Make sure the folder exists
         os.makedirs(self.chroma_dir, exist_ok=True)
 
+        if index_config is None:
+            index_config = load_index_config(self.chroma_dir, self.collection_name)
+        self.index_config = index_config or {}
+
         # Initialize Chroma (auto-persistent in latest versions)
         self.client = chromadb.PersistentClient(path=self.chroma_dir, settings=Settings())
-        self.collection = self.client.get_or_create_collection(name=self.collection_name)
+        existing = [getattr(c, "name", c) for c in self.client.list_collections()]  # objects or names, by version
+        if reset and self.collection_name in existing:
+            print(f"Dropping existing collection '{self.collection_name}'")
+            self.client.delete_collection(self.collection_name)
+
+        if reset or self.collection_name not in existing:
+            # HNSW settings only take effect when the index is built
+            self.collection = self.client.create_collection(
+                name=self.collection_name,
+                metadata=hnsw_metadata(self.index_config) or None,
+            )
+        else:
+            # Never pass metadata here: some versions overwrite it, relabelling
+            # hnsw:space without rebuilding the index
+            self.collection = self.client.get_collection(self.collection_name)
+            current = self.collection.metadata or {}
+            wanted = hnsw_metadata(self.index_config)
+            if any(current.get(key, "l2" if key == "hnsw:space" else None) != value for key, value in wanted.items()):
+                print(f"Warning: '{self.collection_name}' was built with {current or 'default settings'} but the "
+                      f"index config asks for {wanted}; pass reset=True to rebuild it")
+        self.space = (self.collection.metadata or {}).get("hnsw:space", "l2")
 
         self.ids = []
         self.docs = []
         self.metadatas = []
         self.vectors = []
+        self.domains = set()  # domains whose embedding file was loaded
 
     def load_all_json(self):
         embedding_files = glob.glob(os.path.join(self.embeddings_dir, "*_embeddings.json"))
@@ -30,6 +106,7 @@ class ChromaIngestor:
 
         for emb_path in embedding_files:
             print(f"Loading {emb_path}")
+            self.domains.add(os.path.basename(emb_path)[:-len("_embeddings.json")])
             with open(emb_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
             for item in data:
@@ -39,6 +116,25 @@ class ChromaIngestor:
                 self.vectors.append(item["embedding"])
         print(f"Loaded {len(self.ids)} total embeddings")
 
+    def _drop_stale_records(self, batch_size=1000):
+        """
+        A domain's embedding file is the full list of its chunks, so records of
+        a loaded domain that are not in it are stale: chunks of deleted or
+        edited files, or ids from an older id scheme. Removing them keeps a
+        re-run from duplicating what is already stored under other ids.
+        """
+        wanted = set(self.ids)
+        stale = []
+        for domain in sorted(self.domains):
+            existing = self.collection.get(where={"domain": domain}, include=[])["ids"]
+            stale.extend(i for i in existing if i not in wanted)
+
+        if not stale:
+            return
+        print(f"Removing {len(stale)} stale embeddings from Chroma")
+        for i in range(0, len(stale), batch_size):
+            self.collection.delete(ids=stale[i:i + batch_size])
+
     def _filter_existing_ids(self):
         if not self.ids:
             return
@@ -73,25 +169,112 @@ class ChromaIngestor:
         self.ids, self.docs, self.metadatas, self.vectors = map(list, zip(*new_data))
 
     def ingest(self, batch_size=500):
+        self._drop_stale_records()
+
         if not self.ids:
             print("No data to ingest.")
-            return
+        else:
+            # Remove duplicates already in Chroma
+            self._filter_existing_ids()
 
-        # Remove duplicates already in Chroma
-        self._filter_existing_ids()
+            if not self.ids:
+                print("No new embeddings to add.")
+            else:
+                print(f"Adding {len(self.ids)} new embeddings to Chroma...")
 
-        if not self.ids:
-            print("No new embeddings to add.")
-            return
+                for i in range(0, len(self.ids), batch_size):
+                    self.collection.add(
+                        ids=self.ids[i:i + batch_size],
+                        embeddings=self.vectors[i:i + batch_size],
+                        documents=self.docs[i:i + batch_size],
+                        metadatas=self.metadatas[i:i + batch_size],
+                    )
+                print(f"Stored {len(self.ids)} embeddings in Chroma (auto-persisted).")
+                print(f"Chroma DB folder: {self.chroma_dir}")
 
-        print(f"Adding {len(self.ids)} new embeddings to Chroma...")
+        # Refresh calibration even when nothing was added (the watcher may have changed the collection)
+        self.compute_domain_stats()
 
-        for i in range(0, len(self.ids), batch_size):
-            self.collection.add(
-                ids=self.ids[i:i + batch_size],
-                embeddings=self.vectors[i:i + batch_size],
-                documents=self.docs[i:i + batch_size],
-                metadatas=self.metadatas[i:i + batch_size],
+    def upsert(self, ids, docs, metadatas, vectors, batch_size=500):
+        """Insert or overwrite chunks directly (used by the ingestion watcher)."""
+        for i in range(0, len(ids), batch_size):
+            self.collection.upsert(
+                ids=ids[i:i + batch_size],
+                embeddings=vectors[i:i + batch_size],
+                documents=docs[i:i + batch_size],
+                metadatas=metadatas[i:i + batch_size],
             )
-        print(f"Stored {len(self.ids)} embeddings in Chroma (auto-persisted).")
-        print(f"Chroma DB folder: {self.chroma_dir}")
\ No newline at end of file
+
+    def delete_source(self, domain, source):
+        """Remove every chunk that came from one raw file."""
+        self.collection.delete(where={"$and": [{"domain": domain}, {"source": source}]})
+
+    def compute_domain_stats(self, sample_size=200, neighbours=5, seed=42):
+        """
+        Measure how tightly packed each domain is: for a random sample of chunks
+        in each domain, record distances to their nearest neighbours from other
+        files in the same domain (overlapping chunks of one document would
+        otherwise dominate). All domains pooled together are stored as "global".
+
+        These are chunk-to-chunk distances, not query-to-chunk ones, so
+        RAGRetriever only uses them relatively; see RAGRetriever.domain_thresholds.
+        """
+        rng = np.random.default_rng(seed)
+        all_meta = self.collection.get(include=["metadatas"])["metadatas"]
+        domains = sorted({m.get("domain") for m in all_meta if m and m.get("domain")})
+
+        per_domain = {}
+        pooled = []
+        for domain in domains:
+            domain_ids = self.collection.get(where={"domain": domain}, include=[])["ids"]
+            if len(domain_ids) < 2:
+                continue
+            picked = rng.choice(len(domain_ids), size=min(sample_size, len(domain_ids)), replace=False)
+            sample = self.collection.get(
+                ids=[domain_ids[i] for i in picked], include=["embeddings", "metadatas"]
+            )
+
+            # over-fetch so there are still enough hits once same-file ones are dropped
+            results = self.collection.query(
+                query_embeddings=sample["embeddings"],
+                n_results=min(3 * neighbours + 1, len(domain_ids)),
+                where={"domain": domain},
+                include=["distances", "metadatas"],
+            )
+
+            distances = []
+            for own_meta, hit_metas, hit_dists in zip(sample["metadatas"], results["metadatas"], results["distances"]):
+                own_source = (own_meta or {}).get("source")
+                other_files = [
+                    to_l2_distance(float(d), self.space)
+                    for m, d in zip(hit_metas, hit_dists) if (m or {}).get("source") != own_source
+                ]
+                distances.extend(other_files[:neighbours])
+            if not distances:
+                continue
+
+            per_domain[domain] = self._percentiles(distances, len(sample["ids"]))
+            pooled.extend(distances)
+
+        stats = {
+            "global": self._percentiles(pooled, sum(d["samples"] for d in per_domain.values())) if pooled else None,
+            "domains": per_domain,
+        }
+
+        path = stats_path(self.chroma_dir, self.collection_name)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+        print(f"Saved distance stats for {len(per_domain)} domains → {path}")
+        return stats
+
+    @staticmethod
+    def _percentiles(distances, samples):
+        p50, p75, p90, p99 = np.percentile(distances, [50, 75, 90, 99])
+        return {
+            "samples": samples,
+            "distances": len(distances),
+            "p50": float(p50),
+            "p75": float(p75),
+            "p90": float(p90),
+            "p99": float(p99),
+        }
\ No newline at end of file
@@ -0,0 +1,150 @@
+import json
+import os
+import glob
+import time
+import uuid
+import itertools
+import numpy as np
+import chromadb
+from chromadb.config import Settings
+from rag_agent.app.ingestion.store_embeddings import hnsw_metadata, index_config_path
+
+DEFAULT_GRID = {
+    "space": ["l2", "cosine", "ip"],
+    "M": [8, 16, 32],
+    "construction_ef": [100, 200],
+    "search_ef": [10, 50, 100],
+}
+
+
+class IndexTuner:
+    """
+    Sweeps Chroma HNSW settings for the chunk embeddings. A random slice of the
+    embeddings is held out as queries (and not indexed); every candidate index is
+    scored on recall@k against exact brute-force search and on p95 single-query
+    latency. The best config is saved for ChromaIngestor / RAGRetriever.
+    """
+
+    def __init__(self, embeddings_dir, k=5, holdout=0.1, max_queries=200, seed=42):
+        self.embeddings_dir = os.path.abspath(embeddings_dir)
+        self.k = k
+
+        vectors = self._load_vectors()
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(vectors))
+        n_queries = min(max_queries, max(1, int(len(vectors) * holdout)))
+        if len(vectors) - n_queries < k:
+            raise ValueError(f"Need more than {n_queries + k} embeddings to tune, found {len(vectors)}")
+
+        self.queries = vectors[order[:n_queries]]
+        self.corpus = vectors[order[n_queries:]]
+        print(f"Tuning on {len(self.corpus)} indexed vectors, {len(self.queries)} held-out queries, k={k}")
+
+        # Throwaway in-memory client for candidate indexes
+        self.client = chromadb.EphemeralClient(settings=Settings(anonymized_telemetry=False))
+        self._exact = {}
+
+    def _load_vectors(self):
+        embedding_files = glob.glob(os.path.join(self.embeddings_dir, "*_embeddings.json"))
+        if not embedding_files:
+            raise ValueError(f"No embedding JSON files found in {self.embeddings_dir}")
+
+        vectors = []
+        for emb_path in embedding_files:
+            with open(emb_path, "r", encoding="utf-8") as f:
+                vectors.extend(item["embedding"] for item in json.load(f))
+        return np.asarray(vectors, dtype=np.float32)
+
+    # -------------------------------
+    # Ground truth
+    # -------------------------------
+    def exact_neighbours(self, space):
+        """Brute-force top-k corpus indices for every query, in the given distance space."""
+        if space in self._exact:
+            return self._exact[space]
+
+        if space == "l2":
+            dists = (
+                (self.queries ** 2).sum(axis=1, keepdims=True)
+                - 2 * self.queries @ self.corpus.T
+                + (self.corpus ** 2).sum(axis=1)
+            )
+        elif space == "cosine":
+            q = self.queries / np.linalg.norm(self.queries, axis=1, keepdims=True)
+            c = self.corpus / np.linalg.norm(self.corpus, axis=1, keepdims=True)
+            dists = 1 - q @ c.T
+        elif space == "ip":
+            dists = 1 - self.queries @ self.corpus.T
+        else:
+            raise ValueError(f"Unknown distance space: {space}")
+
+        top = np.argpartition(dists, self.k - 1, axis=1)[:, :self.k]
+        self._exact[space] = [set(row.tolist()) for row in top]
+        return self._exact[space]
+
+    # -------------------------------
+    # Candidate evaluation
+    # -------------------------------
+    def evaluate(self, config, batch_size=500):
+        """Build one candidate index and return its recall@k and latency."""
+        collection = self.client.create_collection(
+            name=f"tune_{uuid.uuid4().hex[:12]}", metadata=hnsw_metadata(config)
+        )
+        try:
+            build_start = time.perf_counter()
+            for i in range(0, len(self.corpus), batch_size):
+                batch = self.corpus[i:i + batch_size]
+                collection.add(
+                    ids=[str(j) for j in range(i, i + len(batch))],
+                    embeddings=batch.tolist(),
+                )
+            build_ms = (time.perf_counter() - build_start) * 1000
+
+            exact = self.exact_neighbours(config["space"])
+            latencies = []
+            hits = 0
+            for query, truth in zip(self.queries, exact):
+                start = time.perf_counter()
+                result = collection.query(query_embeddings=[query.tolist()], n_results=self.k, include=[])
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += len(truth & {int(j) for j in result["ids"][0]})
+        finally:
+            self.client.delete_collection(collection.name)
+
+        return {
+            **config,
+            "recall_at_k": hits / (len(self.queries) * self.k),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "build_ms": build_ms,
+        }
+
+    def sweep(self, grid=None, target_recall=0.95):
+        """
+        Evaluate every combination in grid. The best config is the lowest-p95 one
+        reaching target_recall, or the highest-recall one if none does.
+        """
+        grid = grid or DEFAULT_GRID
+        keys = list(grid.keys())
+        results = []
+        for values in itertools.product(*(grid[key] for key in keys)):
+            config = dict(zip(keys, values))
+            result = self.evaluate(config)
+            print(f"{config} → recall@{self.k}={result['recall_at_k']:.3f}, p95={result['p95_ms']:.2f}ms")
+            results.append(result)
+
+        passing = [r for r in results if r["recall_at_k"] >= target_recall]
+        if passing:
+            best = min(passing, key=lambda r: r["p95_ms"])
+        else:
+            print(f"No config reached recall@{self.k} >= {target_recall}; picking the most accurate.")
+            best = max(results, key=lambda r: (r["recall_at_k"], -r["p95_ms"]))
+
+        return best, results
+
+    def save(self, best, chroma_dir, collection_name):
+        path = index_config_path(chroma_dir, collection_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({**best, "k": self.k, "queries": len(self.queries)}, f, indent=2)
+        print(f"Saved best index config → {path}")
+        return path
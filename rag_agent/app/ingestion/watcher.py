@@ -0,0 +1,302 @@
+import os
+import time
+import threading
+from pathlib import Path
+from rag_agent.app.ingestion.document_loader import SUPPORTED_EXTENSIONS
+
+# ---------- Optional inotify/FSEvents backend ---------- #
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    # fallback: poll the raw directory for mtime/size changes
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class _EventHandler(FileSystemEventHandler):
+    """Forwards watchdog events for files to IngestionWatcher.mark()."""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        self.watcher.mark(event.src_path)
+        dest = getattr(event, "dest_path", None)
+        if dest:
+            self.watcher.mark(dest)
+
+
+class IngestionWatcher:
+    """
+    Keeps Chroma in sync with raw_dir. File events are debounced per path
+    (a burst of saves becomes one update once the file has been quiet for
+    debounce_s), then only that file goes through extraction, embedding and
+    Chroma upsert, or is deleted from Chroma if it disappeared.
+    """
+
+    def __init__(self, loader, vectorizer, ingestor, debounce_s: float = 2.0,
+                 poll_interval: float = 1.0, use_inotify: bool = True,
+                 stats_every: int = 20, stats_interval_s: float = 600.0, max_retries: int = 3):
+        """
+        :param loader: DocumentLoader over raw_dir (use_hashing=True skips touch-only events)
+        :param vectorizer: ChunkVectorizer used for embedding
+        :param ingestor: ChromaIngestor for the live collection
+        :param debounce_s: quiet period before a changed file is ingested
+        :param poll_interval: seconds between directory scans in polling mode
+        :param use_inotify: use watchdog if installed, otherwise poll
+        :param stats_every: recompute per-domain retrieval stats after this many file updates/deletes
+        :param stats_interval_s: ... or once this long has passed since the last recompute with any update pending
+        :param max_retries: times a failed file is re-queued (e.g. still locked by the editor on Windows) before giving up
+        """
+        self.loader = loader
+        self.vectorizer = vectorizer
+        self.ingestor = ingestor
+        self.raw_dir = loader.raw_dir.resolve()
+        self.debounce_s = debounce_s
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and Observer is not None
+        self.stats_every = stats_every
+        self.stats_interval_s = stats_interval_s
+        self.max_retries = max_retries
+        self._changes_since_stats = 0
+        self._last_stats = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._pending = {}  # path -> (first_seen, last_seen)
+        self._forced = set()  # pending paths to re-process even if their hash is unchanged
+        self._retries = {}  # path -> failed attempts so far
+        self._snapshot = {}
+        self._stop = threading.Event()
+
+        self.stats = {
+            "files_updated": 0,
+            "files_deleted": 0,
+            "files_skipped": 0,
+            "errors": 0,
+            "retries": 0,
+            "last_lag_s": None,
+            "max_lag_s": 0.0,
+        }
+
+    # ---------- Event intake ---------- #
+    def mark(self, path, force: bool = False):
+        """
+        Record a change to path; resets its debounce timer. force re-processes
+        the file even if unchanged (used when its near-duplicate original went away).
+        """
+        path = Path(path).resolve()
+        if self._domain_of(path) is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            first_seen, _ = self._pending.get(path, (now, now))
+            self._pending[path] = (first_seen, now)
+            if force:
+                self._forced.add(path)
+
+    def _domain_of(self, path: Path):
+        """Domain name for raw_dir/<domain>/<file>, or None for anything else."""
+        try:
+            rel = path.relative_to(self.raw_dir)
+        except ValueError:
+            return None
+        if len(rel.parts) != 2:
+            return None
+        return rel.parts[0]
+
+    def _scan(self):
+        snapshot = {}
+        for domain_dir in os.scandir(self.raw_dir):
+            try:
+                if not domain_dir.is_dir():
+                    continue
+                entries = list(os.scandir(domain_dir.path))
+            except OSError:
+                continue  # domain folder removed or renamed mid-scan
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        st = entry.stat()
+                        snapshot[Path(entry.path).resolve()] = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    continue  # file vanished between listing and stat; the next scan sees it gone
+        return snapshot
+
+    def _poll(self):
+        snapshot = self._scan()
+        for path in snapshot.keys() | self._snapshot.keys():
+            if snapshot.get(path) != self._snapshot.get(path):
+                self.mark(path)
+        self._snapshot = snapshot
+
+    # ---------- Metrics ---------- #
+    def metrics(self) -> dict:
+        """Queue length, age of the oldest pending change and ingest lag so far."""
+        now = time.monotonic()
+        with self._lock:
+            queue_length = len(self._pending)
+            oldest = min((first for first, _ in self._pending.values()), default=None)
+        return {
+            "queue_length": queue_length,
+            "oldest_pending_s": (now - oldest) if oldest is not None else 0.0,
+            **self.stats,
+        }
+
+    # ---------- Ingestion ---------- #
+    def _ready(self):
+        """Pop (path, first_seen, force) for paths whose last event is older than the debounce window."""
+        now = time.monotonic()
+        with self._lock:
+            ready = [
+                (p, first, p in self._forced)
+                for p, (first, last) in self._pending.items() if now - last >= self.debounce_s
+            ]
+            for path, _, _ in ready:
+                del self._pending[path]
+                self._forced.discard(path)
+        return ready
+
+    def _requeue_orphans(self, dependents):
+        """Re-process files holding near-duplicates whose original was removed."""
+        for dep in dependents:
+            print(f"[watch] Original of a chunk in {dep['domain']}/{dep['source']} is gone; re-queued it")
+            self.mark(self.raw_dir / dep["domain"] / dep["source"], force=True)
+        for file_path, _ in self.loader.pop_orphans():
+            self.mark(file_path, force=True)
+
+    def _forget_chunks(self, domain, name):
+        """Drop a file's chunks from Chroma, the domain's embedding file and the chunk dedup index."""
+        self.ingestor.delete_source(domain, name)
+        self.vectorizer.update_embeddings_file(domain, name, [], [], [], [])
+        dedup = self.vectorizer.dedup_index
+        orphans = []
+        if dedup is not None:
+            orphans = dedup.restore(dedup.remove(domain=domain, source=name))
+            dedup.save()
+        self._requeue_orphans(orphans)
+
+    def _ingest(self, path: Path, force: bool = False):
+        domain = self._domain_of(path)
+        # Rebuild the path the way DocumentLoader.process_all does, so process_log keys match
+        file_path = self.loader.raw_dir / domain / path.name
+
+        dedup = self.vectorizer.dedup_index
+
+        if not path.exists():
+            if path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+                self.stats["files_skipped"] += 1  # editor temp/lock file (.swp, ~$doc.docx, ...)
+                return
+            self.loader.remove_source(file_path, domain)
+            self._forget_chunks(domain, path.name)
+            self.stats["files_deleted"] += 1
+            self._changes_since_stats += 1
+            print(f"[watch] Removed {domain}/{path.name}")
+            return
+
+        new_chunks = self.loader.update_source(file_path, domain, force=force)
+        self._requeue_orphans([])  # files that duplicated this document's old version
+        if new_chunks is None:
+            self.stats["files_skipped"] += 1  # unchanged or unsupported
+            return
+        if not new_chunks:
+            # changed, but nothing left to index: drop the stale chunks
+            self._forget_chunks(domain, path.name)
+            self.stats["files_updated"] += 1
+            self._changes_since_stats += 1
+            print(f"[watch] {domain}/{path.name} produced no chunks; removed its old ones")
+            return
+
+        ids, texts, metadata = self.vectorizer.build_records(new_chunks, domain)
+        dropped = []
+        if dedup is not None:
+            # the file's previous version must not count as a duplicate of its new one
+            pairs = dedup.remove(domain=domain, source=path.name)
+            ids, texts, metadata, dropped = self.vectorizer.filter_near_duplicates(ids, texts, metadata)
+            self._requeue_orphans(dedup.restore(pairs))
+            dedup.save()
+        vectors = [emb.tolist() for emb in self.vectorizer.embed(texts, desc=f"Embedding {path.name}")]
+        self.vectorizer.record_savings(dropped)
+        self.ingestor.delete_source(domain, path.name)
+        if ids:
+            self.ingestor.upsert(ids, texts, metadata, vectors)
+        self.vectorizer.update_embeddings_file(domain, path.name, ids, texts, metadata, vectors)
+        self.stats["files_updated"] += 1
+        self._changes_since_stats += 1
+        print(f"[watch] Indexed {len(ids)} chunks from {domain}/{path.name}")
+
+    def process_ready(self):
+        """Ingest every debounced path; returns how many were handled."""
+        ready = self._ready()
+        for path, first_seen, force in ready:
+            try:
+                self._ingest(path, force=force)
+            except Exception as e:
+                self._retry(path, force, e)
+                continue
+            self._retries.pop(path, None)
+            lag = time.monotonic() - first_seen
+            self.stats["last_lag_s"] = lag
+            self.stats["max_lag_s"] = max(self.stats["max_lag_s"], lag)
+        self._maybe_refresh_stats()
+        if ready:
+            print(self.metrics())
+        return len(ready)
+
+    def _retry(self, path: Path, force: bool, error: Exception):
+        """Re-queue a failed path for another debounce window, up to max_retries times."""
+        attempts = self._retries.get(path, 0) + 1
+        if attempts > self.max_retries:
+            self._retries.pop(path, None)
+            self.stats["errors"] += 1
+            print(f"[watch] Failed to ingest {path} after {self.max_retries} retries: {error}")
+            return
+        self._retries[path] = attempts
+        self.stats["retries"] += 1
+        print(f"[watch] Failed to ingest {path} ({error}); retry {attempts}/{self.max_retries}")
+        self.mark(path, force=force)
+
+    def _maybe_refresh_stats(self):
+        """Keep RAGRetriever's per-domain thresholds current, including for new domains."""
+        if not self._changes_since_stats:
+            return
+        due = (self._changes_since_stats >= self.stats_every
+               or time.monotonic() - self._last_stats >= self.stats_interval_s)
+        if not due:
+            return
+        try:
+            self.ingestor.compute_domain_stats()
+        except Exception as e:
+            print(f"[watch] Failed to refresh domain stats: {e}")
+        self._changes_since_stats = 0
+        self._last_stats = time.monotonic()
+
+    # ---------- Daemon loop ---------- #
+    def stop(self):
+        self._stop.set()
+
+    def run_forever(self, tick: float = 0.25):
+        observer = None
+        if self.use_inotify:
+            observer = Observer()
+            observer.schedule(_EventHandler(self), str(self.raw_dir), recursive=True)
+            observer.start()
+            print(f"[watch] Watching {self.raw_dir} (watchdog)")
+        else:
+            self._snapshot = self._scan()
+            print(f"[watch] Polling {self.raw_dir} every {self.poll_interval}s")
+
+        last_poll = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                if observer is None and time.monotonic() - last_poll >= self.poll_interval:
+                    self._poll()
+                    last_poll = time.monotonic()
+                self.process_ready()
+                self._stop.wait(tick)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
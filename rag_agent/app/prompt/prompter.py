@@ -34,6 +34,32 @@ class Prompter:
         )
         return response.text
 
+    def build_prefix(self, context: str = None) -> str:
+        """
+        The stable part of a conversational prompt: instructions plus CONTEXT.
+        Appending "\n" + chunk keeps an existing prefix a literal prefix.
+        """
+        if context:
+            return f"{self.pre_prompt}\n\nCONTEXT:\n{context}"
+        return self.pre_prompt
+
+    def prompt_with_prefix(self, prefix: str, query: str, history=None):
+        """
+        Send prefix + recent conversation + question to Gemini. The prefix goes
+        first and unchanged so repeated context can hit the provider's prompt cache.
+        """
+        parts = [prefix]
+        if history:
+            parts.append("CONVERSATION SO FAR:\n" + "\n".join(f"Q: {q}\nA: {a}" for q, a in history))
+        parts.append(f"QUESTION: {query}")
+        full_prompt = "\n\n".join(parts)
+
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=full_prompt
+        )
+        return response.text
+
 if __name__ == "__main__":
     query = Prompter()
     print(query.prompt("What is the name of the project I used AWS tools for?"))
\ No newline at end of file
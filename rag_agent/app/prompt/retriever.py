@@ -1,10 +1,16 @@
 # rag_retriever.py
 
+import json
+import os
 from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.config import Settings
+from rag_agent.app.ingestion.store_embeddings import stats_path, load_index_config, to_l2_distance
 
 L2_threshold = 1.15
+L2_weak_threshold = 1.6  # fallback: keep the best chunk if it is at least this close
+MIN_STATS_DISTANCES = 30  # fewer neighbour distances than this and a domain's stats are noise
+DOMAIN_SCALE_RANGE = (0.8, 1.25)  # how far a domain's density may move the thresholds above
 
 class RAGRetriever:
     """
@@ -18,9 +24,72 @@ class RAGRetriever:
         self.client = chromadb.PersistentClient(path=chroma_dir)
         self.collection = self.client.get_collection(collection_name)
 
+        # Distance space the collection was built with; thresholds below are on the L2 scale
+        self.space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+        index_config = load_index_config(chroma_dir, collection_name)
+        if index_config and index_config.get("space", "l2") != self.space:
+            print(f"Warning: '{collection_name}' uses {self.space} space but the tuned config is "
+                  f"{index_config['space']}; rebuild it with scripts/tune_index.py")
+
         # Initialize embedding model
         self.embedding_model = SentenceTransformer(embedding_model_name)
 
+        # Per-domain distance percentiles written by ChromaIngestor (may be missing)
+        self.stats_path = stats_path(chroma_dir, collection_name)
+        self._stats_mtime = None
+        self.domain_stats = {}
+        self._refresh_domain_stats()
+        self.last_retrieval_stats = None
+
+    def _refresh_domain_stats(self):
+        """(Re)load the stats file if it changed, e.g. after the ingestion watcher recalibrated."""
+        try:
+            mtime = os.path.getmtime(self.stats_path)
+        except OSError:
+            return
+        if mtime == self._stats_mtime:
+            return
+        with open(self.stats_path, "r", encoding="utf-8") as f:
+            self.domain_stats = json.load(f)
+        self._stats_mtime = mtime
+
+    def domain_thresholds(self, domain: str):
+        """
+        (strong, weak) L2 cut-offs for a domain. Chunks closer than `strong` are
+        kept; `weak` only rescues the single best chunk.
+
+        This is a heuristic. The ingestion stats are chunk-to-chunk distances,
+        which are not on the query-to-chunk scale, so they never become cut-offs
+        themselves: the hand-tuned constants are scaled by the domain's p90 over
+        the collection-wide p90, clamped to DOMAIN_SCALE_RANGE. A domain packed
+        tighter than average gets stricter cut-offs, a sparser one looser, and
+        an average domain keeps exactly 1.15 / 1.6. Falls back to the constants
+        when stats are missing or rest on too few distances.
+        """
+        self._refresh_domain_stats()
+        stats = (self.domain_stats.get("domains") or {}).get(domain)
+        overall = self.domain_stats.get("global")
+        if not stats or not overall or stats.get("distances", 0) < MIN_STATS_DISTANCES or overall["p90"] <= 0:
+            return L2_threshold, L2_weak_threshold
+        low, high = DOMAIN_SCALE_RANGE
+        scale = min(max(stats["p90"] / overall["p90"], low), high)
+        return L2_threshold * scale, L2_weak_threshold * scale
+
+    def _query(self, query_emb, n_results: int, where: dict = None):
+        """
+        Run one Chroma query and return (ids, documents, metadatas, distances) for the first query.
+        """
+        kwargs = {
+            "query_embeddings": query_emb,
+            "n_results": n_results,
+            "include": ["documents", "metadatas", "distances"],
+        }
+        if where:
+            kwargs["where"] = where
+        results = self.collection.query(**kwargs)
+        distances = [to_l2_distance(float(d), self.space) for d in results['distances'][0]]
+        return results['ids'][0], results['documents'][0], results['metadatas'][0], distances
+
     def embed_query(self, query: str):
         """
         Embed a single query into a vector.
@@ -50,31 +119,121 @@ class RAGRetriever:
         context = "\n".join(retrieved_docs)
         return context
 
-    def retrieve_v2(self, query: str, top_k: int=5) -> str:
+    def retrieve_v2(self, query: str, top_k: int=5, adaptive: bool = False, max_k: int = 20) -> str:
+        if adaptive:
+            return self.retrieve_adaptive(query, top_k=top_k, max_k=max_k)
+
         query_emb = self.embed_query(query)
         results = self.collection.query(
             query_embeddings=query_emb,
             n_results=top_k
         )
+        distances = [to_l2_distance(float(d), self.space) for d in results['distances'][0]]
         filtered_docs = []
         for i in range(0, len(results['documents'][0])):
-            L2_distance = float(results['distances'][0][i]) #L2 distance is given by Chroma DB after doing similarity search
+            L2_distance = distances[i] #distance given by Chroma DB after similarity search, on the L2 scale
             if L2_distance < L2_threshold:
                 filtered_docs.append(results['documents'][0][i])
 
         #case if no context matches, return the first chunk if its weakly similar
-        if len(filtered_docs) == 0 and float(results['distances'][0][0]) < 1.6:
+        if len(filtered_docs) == 0 and distances[0] < L2_weak_threshold:
             filtered_docs.append(results['documents'][0][0])
 
         context = "\n".join(filtered_docs)
-        print('Distances:', results['distances'][0])
+        print('Distances:', distances)
         #print('Documents:', results['documents'][0])
         #print('Returned Context:', context)
         return context
 
+    def _adaptive_cutoff(self, distances, metadatas, min_k: int = 1, gap: float = 0.15) -> int:
+        """
+        Number of leading results to keep. Stops at the first chunk past its
+        domain's strong threshold, then trims further at the largest jump
+        between consecutive distances if that jump is at least `gap` (the elbow).
+        """
+        cut = 0
+        for dist, meta in zip(distances, metadatas):
+            strong, _ = self.domain_thresholds((meta or {}).get("domain"))
+            if dist >= strong:
+                break
+            cut += 1
+
+        best_gap, elbow = 0.0, cut
+        for i in range(max(min_k, 1), cut):
+            step = distances[i] - distances[i - 1]
+            if step > best_gap:
+                best_gap, elbow = step, i
+        if best_gap >= gap:
+            cut = elbow
+
+        return cut
+
+    def retrieve_adaptive(self, query: str, top_k: int = 5, max_k: int = 20, min_k: int = 1,
+                          gap: float = 0.15) -> str:
+        """
+        Retrieve a variable number of chunks. Starts at top_k and doubles k (up to
+        max_k) while every returned chunk is still relevant; otherwise shrinks to the
+        point where relevance drops off. Logs chunks/tokens saved versus a fixed top_k.
+        """
+        query_emb = self.embed_query(query)
+
+        k = top_k
+        while True:
+            ids, docs, metas, distances = self._query(query_emb, k)
+            cut = self._adaptive_cutoff(distances, metas, min_k=min_k, gap=gap)
+            if cut == len(distances) == k and k < max_k:
+                k = min(k * 2, max_k)  # everything fetched is strong; there may be more
+                continue
+            break
+
+        kept = docs[:cut]
+
+        # case if no context matches, return the first chunk if it is weakly similar
+        if not kept and distances:
+            _, weak = self.domain_thresholds((metas[0] or {}).get("domain"))
+            if distances[0] < weak:
+                kept = docs[:1]
+
+        baseline = docs[:top_k]
+        baseline_tokens = sum(len(d.split()) for d in baseline)  # crude token count, as in chunk_text
+        kept_tokens = sum(len(d.split()) for d in kept)
+        self.last_retrieval_stats = {
+            "fetched_k": k,
+            "kept_chunks": len(kept),
+            "chunks_saved": len(baseline) - len(kept),
+            "prompt_tokens_saved": baseline_tokens - kept_tokens,
+        }
+        print('Distances:', distances)
+        print(self.last_retrieval_stats)
+
+        return "\n".join(kept)
+
+    def search(self, query_emb, top_k: int = 5, exclude_ids=None):
+        """
+        Structured retrieval for callers that manage their own context (e.g.
+        conversation sessions): returns [(id, document, distance)] that pass the
+        per-domain thresholds, skipping exclude_ids. Keeps the weak-match
+        fallback of retrieve_v2.
+        """
+        exclude_ids = exclude_ids or set()
+        ids, docs, metas, distances = self._query(query_emb, top_k + len(exclude_ids))
+
+        hits = []
+        for cid, doc, meta, dist in zip(ids, docs, metas, distances):
+            strong, _ = self.domain_thresholds((meta or {}).get("domain"))
+            if cid not in exclude_ids and dist < strong:
+                hits.append((cid, doc, dist))
+
+        if not hits and ids and ids[0] not in exclude_ids:
+            _, weak = self.domain_thresholds((metas[0] or {}).get("domain"))
+            if distances[0] < weak:
+                hits.append((ids[0], docs[0], distances[0]))
+
+        return hits[:top_k]
+
 if __name__ == "__main__":
     retriever = RAGRetriever(collection_name="rag_chunks")
 
     query = "What date is the midterm for adv machine learning systems??"
-    context = retriever.retrieve_v2(query, top_k=3)
+    context = retriever.retrieve_v2(query, top_k=3, adaptive=True)
     print("Retrieved Context:\n", context)
\ No newline at end of file
@@ -1,58 +1,120 @@
 # train_logistic_classifier.py
 
+import hashlib
+import time
+import zipfile
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import classification_report, confusion_matrix
 from sentence_transformers import SentenceTransformer
-import joblib
-
-# -------------------------------
-# 1. Load Dataset
-# -------------------------------
-df = pd.read_csv('dataset.csv')  # replace with your filename if different
-
-# Check dataset
-print("Dataset sample:")
-print(df.head())
-
-queries = df['query'].tolist()
-labels = df['label'].tolist()
-
-# -------------------------------
-# 2. Split into Train/Test
-# -------------------------------
-X_train, X_test, y_train, y_test = train_test_split(
-    queries, labels, test_size=0.2, random_state=42, stratify=labels
-)
-
-# -------------------------------
-# 3. Generate Embeddings
-# -------------------------------
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-X_train_emb = embedding_model.encode(X_train, convert_to_numpy=True, show_progress_bar=True)
-X_test_emb = embedding_model.encode(X_test, convert_to_numpy=True, show_progress_bar=True)
-
-# -------------------------------
-# 4. Train Logistic Regression
-# -------------------------------
-clf = LogisticRegression(max_iter=1000)
-clf.fit(X_train_emb, y_train)
-
-# -------------------------------
-# 5. Evaluate
-# -------------------------------
-y_pred = clf.predict(X_test_emb)
-print("\nClassification Report:")
-print(classification_report(y_test, y_pred))
-
-print("Confusion Matrix:")
-print(confusion_matrix(y_test, y_pred))
-
-# -------------------------------
-# 6. Save Models
-# -------------------------------
-joblib.dump(clf, "query_classifier.pkl")
-joblib.dump(embedding_model, "embedding_model.pkl")
-
-print("\nModels saved as 'query_classifier.pkl' and 'embedding_model.pkl'.")
\ No newline at end of file
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_CACHE = 'dataset_embeddings.npz'
+WEIGHTS_FILE = 'query_classifier.npz'
+FORMAT_VERSION = 1  # bump when the layout of WEIGHTS_FILE changes
+
+
+def dataset_fingerprint(queries, model_name):
+    """Hash of the query texts + embedding model, used to validate the embedding cache."""
+    sha256 = hashlib.sha256(model_name.encode("utf-8"))
+    for q in queries:
+        sha256.update(q.encode("utf-8"))
+        sha256.update(b"\0")
+    return sha256.hexdigest()
+
+
+def load_or_compute_embeddings(queries, model_name, cache_path=EMBEDDING_CACHE):
+    """
+    Return embeddings for every query, reusing the on-disk cache when the
+    dataset and model are unchanged. The model is only loaded on a cache miss.
+    """
+    fingerprint = dataset_fingerprint(queries, model_name)
+    try:
+        with np.load(cache_path, allow_pickle=False) as cached:
+            if str(cached['fingerprint']) == fingerprint:
+                print(f"Loaded cached embeddings from '{cache_path}'.")
+                return cached['embeddings']
+        print("Embedding cache is stale; recomputing.")
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+        # missing, truncated or old-layout cache
+        print(f"No usable embedding cache ({e}); computing embeddings.")
+
+    embedding_model = SentenceTransformer(model_name)
+    embeddings = embedding_model.encode(queries, convert_to_numpy=True, show_progress_bar=True)
+    np.savez(cache_path, embeddings=embeddings, fingerprint=np.array(fingerprint))
+    return embeddings
+
+
+def export_weights(clf, path=WEIGHTS_FILE, model_name=EMBEDDING_MODEL_NAME):
+    """
+    Export the classifier as plain NumPy arrays so inference needs neither
+    sklearn nor joblib. Weights are always stored as (n_classes, dim) so the
+    runtime can use a single softmax: for binary models sklearn keeps one
+    coefficient row, which becomes logits [0, z] (softmax of that == sigmoid(z)).
+    """
+    coef = clf.coef_.astype(np.float32)
+    intercept = clf.intercept_.astype(np.float32)
+    if coef.shape[0] == 1:
+        coef = np.vstack([np.zeros_like(coef), coef])
+        intercept = np.concatenate([np.zeros_like(intercept), intercept])
+
+    np.savez(
+        path,
+        weights=coef,
+        bias=intercept,
+        classes=np.asarray(clf.classes_).astype(str),
+        embedding_model=np.array(model_name),
+        format_version=np.array(FORMAT_VERSION),
+        trained_at=np.array(time.strftime("%Y-%m-%dT%H:%M:%S")),
+    )
+
+
+if __name__ == "__main__":
+    # -------------------------------
+    # 1. Load Dataset
+    # -------------------------------
+    df = pd.read_csv('dataset.csv')  # replace with your filename if different
+
+    # Check dataset
+    print("Dataset sample:")
+    print(df.head())
+
+    queries = df['query'].tolist()
+    labels = df['label'].tolist()
+
+    # -------------------------------
+    # 2. Generate Embeddings (cached between runs)
+    # -------------------------------
+    embeddings = load_or_compute_embeddings(queries, EMBEDDING_MODEL_NAME)
+
+    # -------------------------------
+    # 3. Split into Train/Test
+    # -------------------------------
+    X_train_emb, X_test_emb, y_train, y_test = train_test_split(
+        embeddings, labels, test_size=0.2, random_state=42, stratify=labels
+    )
+
+    # -------------------------------
+    # 4. Train Logistic Regression
+    # -------------------------------
+    clf = LogisticRegression(max_iter=1000)
+    clf.fit(X_train_emb, y_train)
+
+    # -------------------------------
+    # 5. Evaluate
+    # -------------------------------
+    y_pred = clf.predict(X_test_emb)
+    print("\nClassification Report:")
+    print(classification_report(y_test, y_pred))
+
+    print("Confusion Matrix:")
+    print(confusion_matrix(y_test, y_pred))
+
+    # -------------------------------
+    # 6. Export Weights
+    # -------------------------------
+    export_weights(clf)
+
+    print(f"\nClassifier weights saved as '{WEIGHTS_FILE}' (format v{FORMAT_VERSION}).")
@@ -1,10 +1,12 @@
 from rag_agent.app.ingestion.create_embeddings import ChunkVectorizer
+from rag_agent.app.ingestion.dedup import NearDuplicateIndex
 
 vectorizer = ChunkVectorizer(
     model_name="sentence-transformers/all-MiniLM-L6-v2",
     chunk_dir="C:\\Users\\Michael\\PycharmProjects\\PersonalRAG\\rag_agent\\data\\processed\\chunks",
     output_dir="C:\\Users\\Michael\\PycharmProjects\\PersonalRAG\\rag_agent\\data\\processed\\embeddings",
-    batch_size=64
+    batch_size=64,
+    dedup_index=NearDuplicateIndex("C:\\Users\\Michael\\PycharmProjects\\PersonalRAG\\rag_agent\\data\\processed\\dedup\\chunk_signatures.json"),
 )
 
 vectorizer.run_pipeline()
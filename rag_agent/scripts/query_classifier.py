@@ -1,28 +1,18 @@
-import joblib
+from sentence_transformers import SentenceTransformer
+from rag_agent.app.classifier.query_classifier import QueryClassifier
 
-# Load trained models
-clf = joblib.load(r"C:\Users\Michael\PycharmProjects\PersonalRAG\rag_agent\classifier\query_classifier.pkl")
-embedding_model = joblib.load(r"C:\Users\Michael\PycharmProjects\PersonalRAG\rag_agent\classifier\embedding_model.pkl")
+# Load exported weights (plain NumPy, no sklearn/joblib)
+clf = QueryClassifier()
+
+# In the agent the query embedding comes from RAGRetriever.embed_query;
+# standalone we load the same model the classifier was trained on.
+embedding_model = SentenceTransformer(clf.embedding_model)
 
 
 def classify_query(query: str, threshold=0.5):
     # Embed the query
     emb = embedding_model.encode([query], convert_to_numpy=True)
-
-    # Get predicted label and probabilities
-    probs = clf.predict_proba(emb)[0]  # shape = [n_classes]
-    classes = clf.classes_  # ['general', 'retrieval']
-
-    # Choose the class with highest probability
-    max_idx = probs.argmax()
-    label = classes[max_idx]
-    confidence = probs[max_idx]
-
-    # Optional: enforce a threshold for retrieval
-    if confidence < threshold:
-        label = "general"  # fallback if classifier isn't confident
-
-    return label, confidence
+    return clf.classify(emb, threshold=threshold)
 
 
 # Example usage
@@ -34,4 +24,4 @@ print(f"Label: {label}, Confidence: {confidence:.2f}")
 if label == "retrieval":
     print("Do Chroma DB retrieval + RAG")
 else:
-    print("Directly answer with LLM")
\ No newline at end of file
+    print("Directly answer with LLM")
@@ -0,0 +1,20 @@
+from rag_agent.app.ingestion.tune_index import IndexTuner
+from rag_agent.app.ingestion.store_embeddings import ChromaIngestor
+
+CHROMA_DIR = r"C:\Users\Michael\PycharmProjects\PersonalRAG\rag_agent\chroma_db"
+EMBEDDINGS_DIR = r"C:\Users\Michael\PycharmProjects\PersonalRAG\rag_agent\data\processed\embeddings"
+
+tuner = IndexTuner(embeddings_dir=EMBEDDINGS_DIR, k=5)
+best, results = tuner.sweep(target_recall=0.95)
+tuner.save(best, CHROMA_DIR, "rag_chunks")
+
+# Rebuild the live collection with the chosen settings (HNSW params are fixed at creation).
+# The embedding files include watcher updates, so nothing ingested live is lost.
+ingestor = ChromaIngestor(
+    chroma_dir=CHROMA_DIR,
+    collection_name="rag_chunks",
+    embeddings_dir=EMBEDDINGS_DIR,
+    reset=True,
+)
+ingestor.load_all_json()
+ingestor.ingest()
@@ -0,0 +1,39 @@
+from rag_agent.app.ingestion.document_loader import DocumentLoader
+from rag_agent.app.ingestion.create_embeddings import ChunkVectorizer
+from rag_agent.app.ingestion.store_embeddings import ChromaIngestor
+from rag_agent.app.ingestion.watcher import IngestionWatcher
+from rag_agent.app.ingestion.dedup import NearDuplicateIndex
+
+BASE_DIR = "C:\\Users\\Michael\\PycharmProjects\\PersonalRAG\\rag_agent\\"
+
+loader = DocumentLoader(
+    raw_dir=BASE_DIR + "data\\raw",
+    processed_dir=BASE_DIR + "data\\processed\\chunks",
+    chunk_size=5,
+    log_file=BASE_DIR + "data\\processed\\logs\\processed_files.json",
+    use_hashing=True,  # skip events that did not change file contents
+    doc_dedup=NearDuplicateIndex(BASE_DIR + "data\\processed\\dedup\\doc_signatures.json"),
+)
+
+vectorizer = ChunkVectorizer(
+    model_name="sentence-transformers/all-MiniLM-L6-v2",
+    chunk_dir=BASE_DIR + "data\\processed\\chunks",
+    output_dir=BASE_DIR + "data\\processed\\embeddings",
+    batch_size=64,
+    dedup_index=NearDuplicateIndex(BASE_DIR + "data\\processed\\dedup\\chunk_signatures.json"),
+)
+
+ingestor = ChromaIngestor(
+    chroma_dir=BASE_DIR + "chroma_db",
+    collection_name="rag_chunks",
+    embeddings_dir=BASE_DIR + "data\\processed\\embeddings",
+)
+
+watcher = IngestionWatcher(loader, vectorizer, ingestor, debounce_s=2.0)
+
+try:
+    watcher.run_forever()
+except KeyboardInterrupt:
+    print(watcher.metrics())
+    print("Doc-dedup report:", loader.dedup_report())
+    print("Near-dedup report:", vectorizer.dedup_report)